@@ -4,12 +4,26 @@ import typing
 from BaseClasses import Item, ItemClassification
 from typing import Optional
 
-class ItemData(typing.NamedTuple):
+class ItemData:
+    __slots__ = ("code", "classification")
+
     code: typing.Optional[int]
     classification: ItemClassification
 
+    def __init__(self, code: typing.Optional[int], classification: ItemClassification):
+        self.code = code
+        self.classification = classification
+
+def get_pcs_count(name: str) -> int:
+    """number of pieces an item with this name adds to the "pcs" counter when collected"""
+    if "Piece" not in name:
+        return 0
+    count = name.split(' ', 1)[0]
+    return int(count) if count.isdigit() else 1
+
 class JigsawItem(Item):
     game: str = "Jigsaw"
+    pcs: int  # get_pcs_count(name), parsed once here instead of on every collect/remove
     
     def __init__(self, name: str, classification: ItemClassification, code: Optional[int], player: int):
         self.name = name
@@ -17,18 +31,25 @@ class JigsawItem(Item):
         self.player = player
         self.code = code
         self.location = None
+        self.pcs = get_pcs_count(name)
+
+# Item names are built once here and reused for `item_table`, `item_groups` and building the item pool.
+puzzle_piece_names = [f"{i} Puzzle Piece{'s' if i > 1 else ''}" for i in range(1, 501)]
+fake_puzzle_piece_names = [f"{i} Fake Puzzle Piece{'s' if i > 1 else ''}" for i in range(1, 501)]
+rotate_trap_names = [f"{i} Rotate Trap{'s' if i > 1 else ''}" for i in range(1, 11)]
+swap_trap_names = [f"{i} Swap Trap{'s' if i > 1 else ''}" for i in range(1, 11)]
 
 item_table = {
-    f"{i} Puzzle Piece{'s' if i > 1 else ''}": ItemData(234782000 + (i - 1), 
+    name: ItemData(234782000 + (i - 1), 
         ItemClassification.progression if i >= 25 else ItemClassification.progression_skip_balancing)
-    for i in range(1, 501)
+    for i, name in enumerate(puzzle_piece_names, 1)
 }
 
-for i in range(1, 501):
-    item_table[f"{i} Fake Puzzle Piece{'s' if i > 1 else ''}"] = ItemData(234785000 + (i - 1), ItemClassification.trap)
-for i in range(1, 11):
-    item_table[f"{i} Rotate Trap{'s' if i > 1 else ''}"] = ItemData(234786000 + (i - 1), ItemClassification.trap)
-    item_table[f"{i} Swap Trap{'s' if i > 1 else ''}"] = ItemData(234787000 + (i - 1), ItemClassification.trap)
+for i, name in enumerate(fake_puzzle_piece_names, 1):
+    item_table[name] = ItemData(234785000 + (i - 1), ItemClassification.trap)
+for i, (rotate_name, swap_name) in enumerate(zip(rotate_trap_names, swap_trap_names), 1):
+    item_table[rotate_name] = ItemData(234786000 + (i - 1), ItemClassification.trap)
+    item_table[swap_name] = ItemData(234787000 + (i - 1), ItemClassification.trap)
 
 encouragements = [
     "Good job!", "Wowza!", "You rock!", "Nailed it!", "Heck yes!",
@@ -62,9 +83,7 @@ for i, phrase in enumerate(encouragements):
 
 
 item_groups = {
-    "Puzzle Pieces": [f"{i} Puzzle Piece{'s' if i > 1 else ''}" for i in range(1, 501)],
-    "Fake Puzzle Pieces": [f"{i} Fake Puzzle Piece{'s' if i > 1 else ''}" for i in range(1, 501)],
-    "Traps": [f"{i} Fake Puzzle Piece{'s' if i > 1 else ''}" for i in range(1, 501)] +
-              [f"{i} Rotate Trap{'s' if i > 1 else ''}" for i in range(1, 11)] +
-              [f"{i} Swap Trap{'s' if i > 1 else ''}" for i in range(1, 11)],
-}
\ No newline at end of file
+    "Puzzle Pieces": puzzle_piece_names,
+    "Fake Puzzle Pieces": fake_puzzle_piece_names,
+    "Traps": fake_puzzle_piece_names + rotate_trap_names + swap_trap_names,
+}
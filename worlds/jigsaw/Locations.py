@@ -1,6 +1,6 @@
 import typing
 
-from BaseClasses import Location
+from BaseClasses import CollectionState, Location
 
 class LocData(typing.NamedTuple):
     id: int
@@ -9,9 +9,14 @@ class LocData(typing.NamedTuple):
 
 class JigsawLocation(Location):
     game: str = "Jigsaw"
+    # The number of puzzle pieces needed to be able to make nmerges merges.
+    pieces_needed: int = 0
 
     def __init__(self, player: int, name: str, address: typing.Optional[int], nmerges: int, parent):
         super().__init__(player, name, address, parent)
         self.nmerges = nmerges
 
+    def access_rule(self, state: CollectionState) -> bool:
+        return state.has("pcs", self.player, self.pieces_needed)
+
 location_table = {f"Merge {i} times": LocData(234782000 + i, "Board") for i in range(1, 2501)}
\ No newline at end of file
@@ -1,10 +1,48 @@
-import math
-from collections import Counter, defaultdict
-from typing import List, Optional
+from functools import lru_cache
 
-from BaseClasses import MultiWorld
 
-from worlds.generic.Rules import set_rule
+@lru_cache(maxsize=32)
+def _get_adjacent_pieces(width: int, height: int, hexagonal: bool) -> tuple[tuple[int, ...], ...]:
+    """
+    Pre-calculate the pieces that are adjacent to each piece of a board.
+
+    The result only depends on the dimensions of the board, so it is cached and shared between all boards of the same
+    shape. The returned tuples must not be modified.
+    """
+    pieces = range(width * height)
+    adjacent_pieces = []
+    for i in pieces:
+        piece_connections = []
+        x = i % width
+        y = i // width
+        if not hexagonal:
+            if x > 0:
+                piece_connections.append(i - 1)
+            if x < width - 1:
+                piece_connections.append(i + 1)
+            if y > 0:
+                piece_connections.append(i - width)
+            if y < height - 1:
+                piece_connections.append(i + width)
+        else:
+            if x > 0:
+                piece_connections.append(i - 1)
+                if x % 2 == 0:
+                    piece_connections.append(i - width - 1)
+                else:
+                    piece_connections.append(i + width - 1)
+            if x < width - 1:
+                piece_connections.append(i + 1)
+                if x % 2 == 0:
+                    piece_connections.append(i - width + 1)
+                else:
+                    piece_connections.append(i + width + 1)
+            piece_connections.append(i - width)
+            piece_connections.append(i + width)
+            piece_connections = [p for p in piece_connections if p in pieces]
+
+        adjacent_pieces.append(tuple(piece_connections))
+    return tuple(adjacent_pieces)
 
 
 class PuzzleBoard:
@@ -14,103 +52,51 @@ class PuzzleBoard:
     Optimized for efficiently adding pieces to the board and calculating the number of new merges that would be made
     when adding a piece.
 
-    A board stores a cluster ID value for each piece placed on the board, where `None` indicates an empty space on the
-    board.
-    _0____3_
-    ____4_3_
-    __1_____
-    __1_22__
+    Clusters of connected pieces are stored as a disjoint-set forest (union-find). Each piece placed on the board stores
+    the index of its parent piece, where `-1` indicates an empty space on the board. Following the parents of a piece
+    always ends at the root piece of its cluster, which is its own parent, so two pieces are in the same cluster when
+    they share the same root. In the diagrams below, each placed piece is labelled by the root of its cluster.
+    _A____B_
+    ____C_B_
+    __D_____
+    __D_EE__
 
     Piece placement behaviours:
     A)
-    A newly placed piece that does not connect to any existing placed pieces is given a new unique cluster ID and is
-    added to a new cluster that is given that ID.
-    _0____3_
-    ____4_3_
-    __1_____
-    __1_22_5 <--
+    A newly placed piece that does not connect to any existing placed pieces becomes the root of a new cluster.
+    _A____B_
+    ____C_B_
+    __D_____
+    __D_EE_F <--
 
     B)
-    A newly placed piece that connects to only a single piece gains the cluster ID of the connecting piece.
-    _0____3_
-    ____4_33 <--
-    __1_____
-    __1_22_5
-
-    C)
-    When a piece is placed that would connect to multiple existing clusters of pieces, the largest of the clusters is
-    found and all pieces in the smaller clusters are added into the largest cluster.
-    The cluster IDs of the smaller clusters are then returned to the board's list of unique cluster IDs, to be re-used
-    later on for new clusters.
-    _0____3_     _0____3_
-    ____4_33     ____4_33
-    __1____X <-- __1____3 <--
-    __1_22_5     __1_22_3 <--
+    When a piece is placed that connects to existing clusters, the new piece and the roots of all the connecting
+    clusters are linked together, always linking the root of the smaller cluster under the root of the larger cluster
+    (union by size). Only the roots are written to, the other pieces in the smaller clusters are not relabelled.
+    _A____B_     _A____B_
+    ____CXB_ <-- ____BBB_
+    __D_____     __D_____
+    __D_EE_F     __D_EE_F
+
+    Finding the root of a piece halves the path that was walked, pointing every piece on the path at its grandparent,
+    so that repeated lookups within large clusters stay cheap.
     """
 
-    # The puzzle board itself. A 1D list used to represent a 2D board.
-    board: list[int | None]
+    # The parent piece index of each piece on the board, `-1` for empty spaces. A 1D list used to represent a 2D board.
+    parent: list[int]
+    # The number of pieces in the cluster of each root piece. Only meaningful for root pieces.
+    size: list[int]
     # A lookup of the adjacent pieces of each piece, used like a dict[int, tuple[int, ...]].
     adjacent_pieces: tuple[tuple[int, ...], ...]
     # The count of merged clusters of connected pieces.
     merges_count: int
-    # cluster ID -> piece indices in the cluster.
-    clusters: dict[int, list[int]]
-
-    # Unused cluster IDs that newly added pieces can be assigned to if they do not merge into an existing cluster.
-    _unused_ids: list[int]
 
     def __init__(self, width: int, height: int, hexagonal: bool):
-        pieces = range(width * height)
-        # The maximum number of IDs that could be needed is the maximum number of isolated pieces possible, which is
-        # half the number of spaces on the board when even, or half one-more-than-the-number-of-spaces when odd.
-        #                   X_X_X
-        #      X_X_  X_X_X  _X_X_
-        # X_X  _X_X  _X_X_  X_X_X
-        # _X_  X_X_  X_X_X  _X_X_
-        # X_X  _X_X  _X_X_  X_X_X
-        # 5/9  8/16  10/20  13/25
-        max_isolated_pieces = len(pieces) // 2 + len(pieces) % 2
-        self._unused_ids = list(range(max_isolated_pieces))
-        self.board = [None] * (len(pieces))
-
-        # Pre-calculate the pieces that are adjacent to each piece.
-        adjacent_pieces = []
-        for i in pieces:
-            piece_connections = []
-            x = i % width
-            y = i // width
-            if not hexagonal:
-                if x > 0:
-                    piece_connections.append(i - 1)
-                if x < width - 1:
-                    piece_connections.append(i + 1)
-                if y > 0:
-                    piece_connections.append(i - width)
-                if y < height - 1:
-                    piece_connections.append(i + width)
-            else:
-                if x > 0:
-                    piece_connections.append(i - 1)
-                    if x % 2 == 0:
-                        piece_connections.append(i - width - 1)
-                    else:
-                        piece_connections.append(i + width - 1)
-                if x < width - 1:
-                    piece_connections.append(i + 1)
-                    if x % 2 == 0:
-                        piece_connections.append(i - width + 1)
-                    else:
-                        piece_connections.append(i + width + 1)
-                piece_connections.append(i - width)
-                piece_connections.append(i + width)
-                piece_connections = [p for p in piece_connections if p in pieces]
-                    
-                
-            adjacent_pieces.append(tuple(piece_connections))
-        self.adjacent_pieces = tuple(adjacent_pieces)
+        num_pieces = width * height
+        self.parent = [-1] * num_pieces
+        self.size = [1] * num_pieces
+        self.adjacent_pieces = _get_adjacent_pieces(width, height, hexagonal)
         self.merges_count = 0
-        self.clusters = {}
 
     def add_piece(self, piece_index: int):
         """
@@ -118,72 +104,46 @@ class PuzzleBoard:
 
         The behavior of attempting to add a piece which is already present on the board is undefined.
         """
-        board = self.board
-        assert board[piece_index] is None, "Attempted to add a piece already present on the board"
-
-        # Get all adjacent cluster IDs.
-        # Use incorrect typing to begin with because it is more efficient to remove `None` this way.
-        adjacent_clusters: set[int] = {board[adjacent_piece] for adjacent_piece in self.adjacent_pieces[piece_index]}  # type: ignore
-        # Empty spaces on the board are set to `None`.
-        adjacent_clusters.discard(None)  # type: ignore
-
-        num_adjacent_clusters = len(adjacent_clusters)
-        if num_adjacent_clusters == 0:
-            # The new piece is isolated, add it to a new cluster.
-            new_cluster_id = self._unused_ids.pop()
-            board[piece_index] = new_cluster_id
-            self.clusters[new_cluster_id] = [piece_index]
-        elif num_adjacent_clusters == 1:
-            # The new piece is adjacent to only one cluster, add it to that cluster.
-            self.merges_count += 1
-            found_cluster = next(iter(adjacent_clusters))
-            board[piece_index] = found_cluster
-            self.clusters[found_cluster].append(piece_index)
-        else:
-            # The new piece is adjacent to multiple clusters, add it to the largest cluster and move all pieces in the
-            # other clusters into the largest cluster.
-            self.merges_count += num_adjacent_clusters
-            clusters = self.clusters
-
-            # Find the largest of the clusters.
-            # Get the first cluster and set it as the current largest.
-            clusters_iter = iter(adjacent_clusters)
-            first_cluster_id: int = next(clusters_iter)
-            pieces_in_cluster = clusters[first_cluster_id]
-            # The clusters and their IDs need to be looped through again once the largest cluster has been determined,
-            # so a list is created to skip having to get the clusters a second time.
-            clusters_and_ids = [(first_cluster_id, pieces_in_cluster)]
-            # Initialise variables for storing the largest cluster.
-            largest_cluster_id = first_cluster_id
-            largest_pieces_in_cluster = pieces_in_cluster
-            largest_cluster_size = len(pieces_in_cluster)
-            # Iterate through the remaining clusters.
-            for cluster_id in clusters_iter:
-                pieces_in_cluster = clusters[cluster_id]
-                cluster_size = len(pieces_in_cluster)
-                clusters_and_ids.append((cluster_id, pieces_in_cluster))
-                if cluster_size > largest_cluster_size:
-                    largest_cluster_size = cluster_size
-                    largest_cluster_id = cluster_id
-                    largest_pieces_in_cluster = pieces_in_cluster
-
-            # Add the new piece to the largest cluster and write cluster ID onto the board for the new piece.
-            board[piece_index] = largest_cluster_id
-            largest_pieces_in_cluster.append(piece_index)
-
-            # Add the pieces in the smaller clusters into the largest cluster.
-            unused_ids = self._unused_ids
-            for cluster_id, pieces_in_cluster in clusters_and_ids:
-                if pieces_in_cluster is largest_pieces_in_cluster:
-                    continue
-                largest_pieces_in_cluster.extend(pieces_in_cluster)
-                # Remove the cluster from the board's clusters.
-                del clusters[cluster_id]
-                # Release the cluster's ID back to the board.
-                unused_ids.append(cluster_id)
-                # Write the new cluster ID onto the board for each piece.
-                for piece_idx in pieces_in_cluster:
-                    board[piece_idx] = largest_cluster_id
+        parent = self.parent
+        assert parent[piece_index] == -1, "Attempted to add a piece already present on the board"
+
+        # Get the roots of all adjacent clusters.
+        # This is a hot loop, so finding the root is inlined rather than being a separate method.
+        # A piece has at most 6 adjacent pieces, so a list is cheaper for removing duplicate roots than hashing into a
+        # set.
+        adjacent_roots = []
+        for adjacent_piece in self.adjacent_pieces[piece_index]:
+            root = parent[adjacent_piece]
+            if root != -1:
+                # Walk up to the root, pointing each piece on the way at its grandparent (path halving).
+                while parent[root] != root:
+                    grandparent = parent[parent[root]]
+                    parent[root] = grandparent
+                    root = grandparent
+                if root not in adjacent_roots:
+                    adjacent_roots.append(root)
+
+        # The new piece starts out as its own cluster.
+        parent[piece_index] = piece_index
+        size = self.size
+        size[piece_index] = 1
+        if not adjacent_roots:
+            return
+
+        # Every adjacent cluster is merged with the new piece.
+        self.merges_count += len(adjacent_roots)
+        root = piece_index
+        root_size = 1
+        for adjacent_root in adjacent_roots:
+            adjacent_size = size[adjacent_root]
+            # Link the smaller cluster under the root of the larger cluster.
+            if adjacent_size > root_size:
+                parent[root] = adjacent_root
+                root = adjacent_root
+            else:
+                parent[adjacent_root] = root
+            root_size += adjacent_size
+            size[root] = root_size
 
     def get_merges_from_adding_piece(self, piece_index: int):
         """
@@ -192,12 +152,22 @@ class PuzzleBoard:
         The behavior of attempting to get the number of merges from adding a piece which is already present in the board
         is undefined.
         """
-        # Get all adjacent cluster IDs.
-        board = self.board
-        assert board[piece_index] is None, "Attempted to get the merges for adding a piece already present on the board"
-        found_cluster_ids = {board[connection] for connection in self.adjacent_pieces[piece_index]}
-        # Empty spaces on the board are set to `None`, so don't count `None` when counting the number of clusters.
-        return len(found_cluster_ids) - 1 if None in found_cluster_ids else len(found_cluster_ids)
+        parent = self.parent
+        assert parent[piece_index] == -1, "Attempted to get the merges for adding a piece already present on the board"
+        # Empty spaces on the board are set to `-1`, so only count the clusters of placed pieces.
+        # As in `add_piece`, duplicate roots are removed using a list rather than a set.
+        found_roots = []
+        for connection in self.adjacent_pieces[piece_index]:
+            root = parent[connection]
+            if root != -1:
+                # Walk up to the root, pointing each piece on the way at its grandparent (path halving).
+                while parent[root] != root:
+                    grandparent = parent[parent[root]]
+                    parent[root] = grandparent
+                    root = grandparent
+                if root not in found_roots:
+                    found_roots.append(root)
+        return len(found_roots)
 
     def remove_piece(self, piece_index: int):
         """
@@ -206,23 +176,25 @@ class PuzzleBoard:
         This is more expensive than adding pieces and is more expensive the larger the cluster that the removed piece
         was part of.
         """
-        board = self.board
-        cluster_id = board[piece_index]
-        assert cluster_id is not None, "Attempted to remove a piece that is not present on the board"
-        # Remove the cluster this piece is in.
-        pieces_in_cluster = self.clusters.pop(cluster_id)
-        # The cluster ID is now unused, so give it back to the board.
-        self._unused_ids.append(cluster_id)
-
-        # Clear the space on the board where the cluster was.
-        for i in pieces_in_cluster:
-            board[i] = None
-
-        # Remove the piece, that has been removed from the board, from the list.
-        pieces_in_cluster.remove(piece_index)
-
-        # Reduce the total merges by the merges of the real cluster.
-        # Note that `piece_index` has already been removed from `pieces_in_cluster`.
+        parent = self.parent
+        assert parent[piece_index] != -1, "Attempted to remove a piece that is not present on the board"
+        adjacent_pieces = self.adjacent_pieces
+
+        # Clear the space on the board where the cluster was, collecting the other pieces in the cluster along the way.
+        # Placed pieces that are adjacent to each other are always in the same cluster, so the cluster can be found by
+        # walking adjacent placed pieces, which also resets every piece in the cluster to be empty.
+        parent[piece_index] = -1
+        pieces_in_cluster = []
+        to_visit = [piece_index]
+        while to_visit:
+            for adjacent_piece in adjacent_pieces[to_visit.pop()]:
+                if parent[adjacent_piece] != -1:
+                    parent[adjacent_piece] = -1
+                    pieces_in_cluster.append(adjacent_piece)
+                    to_visit.append(adjacent_piece)
+
+        # Reduce the total merges by the merges of the cluster.
+        # Note that `piece_index` is not included in `pieces_in_cluster`.
         self.merges_count -= len(pieces_in_cluster)
 
         # Add all the pieces back on, besides the removed piece.
@@ -1,11 +1,16 @@
 import math
-from typing import Any, Dict, TextIO
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from itertools import accumulate
+from random import Random
+from typing import Any, Dict, List, TextIO, Tuple
 
 from BaseClasses import CollectionState, Entrance, Item, ItemClassification, Region, Tutorial
 
 from worlds.AutoWorld import WebWorld, World
 
-from .Items import JigsawItem, item_table, item_groups, encouragements
+from .Items import JigsawItem, get_pcs_count, item_table, item_groups, encouragements, puzzle_piece_names, \
+    fake_puzzle_piece_names, rotate_trap_names, swap_trap_names
 from .Locations import JigsawLocation, location_table
 
 from .Options import GridTypeAndRotations, JigsawOptions, OrientationOfImage, PieceOrder, PieceTypeOrder, jigsaw_option_groups, GridType
@@ -18,6 +23,92 @@ from worlds.LauncherComponents import (
 )
 
 
+@lru_cache(maxsize=None)
+def _optimal_nx_and_ny(number_of_pieces: int, orientation: float) -> Tuple[int, int]:
+    """
+    find the grid closest to number_of_pieces pieces with the most square pieces, for an image orientation times as
+    wide as it is high. cached, since worlds with the same options get the same grid.
+    """
+    # pieces are 1 high and `orientation` wide
+    nHPieces = round(math.sqrt(number_of_pieces * orientation))
+    nVPieces = round(number_of_pieces / nHPieces)
+    
+    errmin = float('inf')
+    optimal_nx, optimal_ny = nHPieces, nVPieces
+
+    for ncv in range(max(1, nVPieces - 2), nVPieces + 3):
+        horizontal_size = ncv * orientation
+        for nch in range(max(1, nHPieces - 2), nHPieces + 3):
+            err = nch / horizontal_size
+            err = err + 1 / err - 2  # error on pieces dimensions ratio
+            err += abs(1 - nch * ncv / number_of_pieces)  # adds error on number of pieces
+
+            if err < errmin:  # keep smallest error
+                errmin = err
+                optimal_nx, optimal_ny = nch, ncv
+
+    return optimal_nx, optimal_ny
+
+
+def _pieces_needed_per_merge(possible_merges: List[int], npieces: int) -> List[int]:
+    """
+    for every number of merges i below npieces, the first number of pieces x with possible_merges[x] >= i.
+    possible_merges can drop where the precollected pieces end, so the binary search runs over its running maximum,
+    which first reaches i at the same index.
+    """
+    highest_merges = list(accumulate(possible_merges, max))
+    return [0] + [bisect_left(highest_merges, i) for i in range(1, npieces)]
+
+
+def _rebalance_item_locations(item_locations: List[int], filler_locations: List[int], possible_merges: List[int],
+                              npieces: int, precollected: int, pieces_per_location: int, random: Random) -> None:
+    """
+    swap item locations with earlier filler locations until every location i is reached with enough pieces for i
+    merges. item_locations and filler_locations are sorted and changed in place.
+    """
+    # is_item[i] tells whether location i is in item_locations; both lists stay sorted
+    is_item = [False] * npieces
+    for loc in item_locations:
+        is_item[loc] = True
+
+    # A swap only changes the number of pieces at the locations from the swapped-in item location onwards (the
+    # swapped-out one is after the current location). The locations before the lowest swapped-in location of a pass
+    # therefore get the same checks in the next pass, and that pass can resume from there. This holds even where
+    # possible_merges decreases.
+    restart_index = 1
+    while restart_index is not None:
+        first_index = restart_index
+        num_pieces = precollected + bisect_left(item_locations, first_index) * pieces_per_location
+
+        restart_index = None
+        for i in range(first_index, npieces - 1):
+
+            if is_item[i]:
+                num_pieces += pieces_per_location
+            if i >= possible_merges[min(npieces, int(num_pieces))]:
+                item_loc_candidates = item_locations[bisect_right(item_locations, i):]
+                filler_loc_candidates = filler_locations[:bisect_right(filler_locations, i)]
+                if item_loc_candidates and filler_loc_candidates:
+                    chosen_item_loc = random.choice(item_loc_candidates)
+                    item_locations.remove(chosen_item_loc)
+                    filler_locations.append(chosen_item_loc)
+                    is_item[chosen_item_loc] = False
+
+                    chosen_filler_loc = random.choice(filler_loc_candidates)
+                    filler_locations.remove(chosen_filler_loc)
+                    item_locations.append(chosen_filler_loc)
+                    is_item[chosen_filler_loc] = True
+                    if restart_index is None or chosen_filler_loc < restart_index:
+                        restart_index = chosen_filler_loc
+                else:
+                    raise RuntimeError("Jigsaw: Failed to find location.......")
+
+                item_locations.sort()
+                filler_locations.sort()
+
+                num_pieces += pieces_per_location  # by swapping you have retro-actively an extra piece
+
+
 class JigsawWeb(WebWorld):
     tutorials = [
         Tutorial(
@@ -68,39 +159,7 @@ class JigsawWorld(World):
             self.uniform_piece_size = False
             return 1, number_of_pieces
         
-        def mround(x):
-            return int(round(x))
-
-        def msqrt(x):
-            return math.sqrt(x)
-
-        def mabs(x):
-            return abs(x)
-        
-        height = 1
-        width = orientation
-
-        nHPieces = mround(msqrt(number_of_pieces * width / height))
-        nVPieces = mround(number_of_pieces / nHPieces)
-        
-        errmin = float('inf')
-        optimal_nx, optimal_ny = nHPieces, nVPieces
-
-        for ky in range(5):
-            ncv = nVPieces + ky - 2
-            for kx in range(5):
-                nch = nHPieces + kx - 2
-                if ncv < 1 or nch < 1:
-                    continue
-                err = nch * height / ncv / width
-                err = (err + 1 / err) - 2  # error on pieces dimensions ratio
-                err += mabs(1 - nch * ncv / number_of_pieces)  # adds error on number of pieces
-
-                if err < errmin:  # keep smallest error
-                    errmin = err
-                    optimal_nx, optimal_ny = nch, ncv
-
-        return optimal_nx, optimal_ny
+        return _optimal_nx_and_ny(number_of_pieces, orientation)
         
     def generate_early(self):       
         
@@ -198,7 +257,9 @@ class JigsawWorld(World):
                     + [1 + self.nx * i for i in range(1, self.ny - 1)] \
                     + [self.nx + self.nx * i for i in range(1, self.ny - 1)]
             edges = [i for i in list(set(edges)) if i not in corners]
-            normal = [i for i in range(1, self.max_piece_index + 1) if i not in corners and i not in edges]
+            border_pieces = set(corners)
+            border_pieces.update(edges)
+            normal = [i for i in range(1, self.max_piece_index + 1) if i not in border_pieces]
             self.random.shuffle(corners)
             self.random.shuffle(edges)
             self.random.shuffle(normal)
@@ -219,9 +280,8 @@ class JigsawWorld(World):
 
             def move_percentage(from_group, to_group, percentage):
                 move_count = int(len(from_group) * percentage)
-                for _ in range(move_count):
-                    if from_group:
-                        to_group.append(from_group.pop(0))
+                to_group.extend(from_group[:move_count])
+                del from_group[:move_count]
 
             # Move a percentage of pieces from each group to the previous group
             for i in range(len(pieces_groups) - 1, 0, -1):
@@ -231,6 +291,9 @@ class JigsawWorld(World):
         
         for pieces in pieces_groups:
             self.random.shuffle(pieces)
+            # The pieces are drawn from the front of each group, so store each group reversed, with its front at the
+            # end, because removing from the end of a list is much cheaper than removing from the start.
+            pieces.reverse()
 
         number_of_checks_out_of_logic = min(self.options.checks_out_of_logic.value, int(self.npieces / 10))
 
@@ -239,47 +302,62 @@ class JigsawWorld(World):
         self.precollected_pieces = []
         self.itempool_pieces = []
         
+        # this loop runs once per piece, so look up the options and methods it uses only once
+        piece_order = self.options.piece_order.value
+        strictness = self.options.strictness_piece_order.value / 100
+        rng_random = self.random.random
+        shuffle = self.random.shuffle
+        merges_fn = board.get_merges_from_adding_piece
+        add_piece = board.add_piece
+        
         first_piece = True
         for pieces in pieces_groups:
             best_result_ever = 0
             while pieces:  # pieces left
                 p = None
                 
-                if self.options.piece_order == PieceOrder.option_random_order:
-                    p = pieces.pop(0)  # pick the first remaining piece
+                if piece_order == PieceOrder.option_random_order:
+                    p = pieces.pop()  # pick the first remaining piece
                     
                 else:
-                    if self.options.strictness_piece_order.value / 100 < self.random.random():
-                        p = pieces.pop(0)
+                    if strictness < rng_random():
+                        p = pieces.pop()
                     
-                    elif self.options.piece_order == PieceOrder.option_every_piece_fits:
-                        for p in pieces:
-                            m = board.get_merges_from_adding_piece(p - 1)
+                    elif piece_order == PieceOrder.option_every_piece_fits:
+                        for index in range(len(pieces) - 1, -1, -1):
+                            p = pieces[index]
+                            m = merges_fn(p - 1)
                             if first_piece or m > 0:
-                                pieces.remove(p)
+                                # The remaining pieces get shuffled, so their order does not need to be kept and the
+                                # picked piece can be swapped with the last piece to remove it cheaply.
+                                pieces[index] = pieces[-1]
+                                pieces.pop()
                                 break
                         else:
-                            p = pieces.pop(0)
-                        self.random.shuffle(pieces)  # shuffle the remaining pieces
+                            p = pieces.pop()
+                        shuffle(pieces)  # shuffle the remaining pieces
                         
-                    elif self.options.piece_order == PieceOrder.option_least_merges_possible:
-                        best_piece = None
+                    elif piece_order == PieceOrder.option_least_merges_possible:
+                        best_index = None
                         best_result = 5
                         # This is a hot loop, so the code within it needs to be as performant as possible.
-                        for p in pieces:
-                            m = board.get_merges_from_adding_piece(p - 1)
+                        for index in range(len(pieces) - 1, -1, -1):
+                            m = merges_fn(pieces[index] - 1)
                             if first_piece or m <= best_result_ever:
-                                best_piece = p
+                                best_index = index
                                 best_result = 0
                                 break
                             if m < best_result:
-                                best_piece = p
+                                best_index = index
                                 best_result = m
                                 
-                        p = best_piece
+                        if best_index is not None:
+                            p = pieces[best_index]
+                            # As above, swap the picked piece with the last piece to remove it cheaply.
+                            pieces[best_index] = pieces[-1]
+                            pieces.pop()
                         best_result_ever = best_result
-                        pieces.remove(p)   
-                        self.random.shuffle(pieces)  # shuffle the remaining pieces                     
+                        shuffle(pieces)  # shuffle the remaining pieces                     
                     
                 if p == None:
                     raise RuntimeError("Jigsaw: No piece selected")
@@ -290,7 +368,7 @@ class JigsawWorld(World):
                 else:
                     self.precollected_pieces.append(p)  # if no merges left, add piece to start_inventory
 
-                board.add_piece(p - 1)
+                add_piece(p - 1)
                 
                 first_piece = False
                 
@@ -317,9 +395,7 @@ class JigsawWorld(World):
                 self.possible_merges.append(merges - number_of_checks_out_of_logic)   
             self.actual_possible_merges.append(merges)
         
-        self.pieces_needed_per_merge = [0]
-        for i in range(1, self.npieces):
-            self.pieces_needed_per_merge.append(next(index for index, value in enumerate(self.possible_merges) if value >= i))
+        self.pieces_needed_per_merge = _pieces_needed_per_merge(self.possible_merges, self.npieces)
         ## end of calculating and storing logic
         
         ## start of locations, filling itempool and precollected items
@@ -346,7 +422,7 @@ class JigsawWorld(World):
         
         self.pieces_per_location = max((pieces_left + locs_pieces - 1) // locs_pieces, self.options.minimum_number_of_pieces_per_bundle.value)   
         self.number_of_locations = (pieces_left + self.pieces_per_location - 1) // self.pieces_per_location
-        self.pool_contents = [f"{self.pieces_per_location} Puzzle Piece{'s' if self.pieces_per_location > 1 else ''}"] * self.number_of_locations
+        self.pool_contents = [puzzle_piece_names[self.pieces_per_location - 1]] * self.number_of_locations
                                 
         pieces_from_start = len(self.precollected_pieces)
         
@@ -355,7 +431,7 @@ class JigsawWorld(World):
                 n = 500
             else:
                 n = pieces_from_start
-            self.multiworld.push_precollected(self.create_item(f"{n} Puzzle Piece{'s' if n > 1 else ''}"))
+            self.multiworld.push_precollected(self.create_item(puzzle_piece_names[n - 1]))
             pieces_from_start -= n
 
         mimic_indices = [i + 1 for i in range(self.npieces)]
@@ -377,24 +453,21 @@ class JigsawWorld(World):
                 l_rotations = rotations
                 
             n = self.options.impact_of_fake_piece_bundles.value
-            for i in range(l_fakes):
-                self.pool_contents.append(f"{n} Fake Puzzle Piece{'s' if n > 1 else ''}")
+            self.pool_contents += [fake_puzzle_piece_names[n - 1]] * l_fakes
                 
             self.fake_pieces_mimic = self.random.choices(mimic_indices, k=n*l_fakes+self.options.starting_fake_pieces.value)
         
             n = self.options.impact_of_swap_traps.value
-            for i in range(l_swaps):
-                self.pool_contents.append(f"{n} Swap Trap{'s' if n > 1 else ''}")
+            self.pool_contents += [swap_trap_names[n - 1]] * l_swaps
             n = self.options.impact_of_rotate_traps.value
-            for i in range(l_rotations):
-                self.pool_contents.append(f"{n} Rotate Trap{'s' if n > 1 else ''}")
+            self.pool_contents += [rotate_trap_names[n - 1]] * l_rotations
         else:
             self.locs_traps = 0
             self.fake_pieces_mimic = self.random.choices(mimic_indices, k=self.options.starting_fake_pieces.value)
 
         num = self.options.starting_fake_pieces.value
         while num > 0:
-            self.multiworld.push_precollected(self.create_item(f"{min(500,num)} Fake Puzzle Piece{'s' if num > 1 else ''}"))
+            self.multiworld.push_precollected(self.create_item(fake_puzzle_piece_names[min(500, num) - 1]))
             num -= min(500,num)
 
 
@@ -426,40 +499,14 @@ class JigsawWorld(World):
                 in_a_row = (locs - 1) // (locs - items)
                 not_in_a_row = max(1, (locs - items) // (items + 1))
             
-            item_locations += [i + j for j in range(in_a_row)]
-            filler_locations += [i + in_a_row + j for j in range(not_in_a_row)]
+            item_locations.extend(range(i, i + in_a_row))
+            filler_locations.extend(range(i + in_a_row, i + in_a_row + not_in_a_row))
             i += in_a_row + not_in_a_row
             locs -= in_a_row + not_in_a_row
             items -= in_a_row
         
-        do_again = True
-        while do_again:
-            num_pieces = len(self.precollected_pieces)
-            
-            do_again = False
-            for i in range(1, self.npieces - 1):
-
-                if i in item_locations:
-                    num_pieces += self.pieces_per_location
-                if i >= self.possible_merges[min(self.npieces, int(num_pieces))]:
-                    do_again = True
-                    item_loc_candidates = [loc for loc in item_locations if loc > i]
-                    filler_loc_candidates = [loc for loc in filler_locations if loc <= i]
-                    if item_loc_candidates and filler_loc_candidates:
-                        chosen_item_loc = self.random.choice(item_loc_candidates)
-                        item_locations.remove(chosen_item_loc)
-                        filler_locations.append(chosen_item_loc)
-                        
-                        chosen_filler_loc = self.random.choice(filler_loc_candidates)
-                        filler_locations.remove(chosen_filler_loc)
-                        item_locations.append(chosen_filler_loc)
-                    else:
-                        raise RuntimeError("Jigsaw: Failed to find location.......")
-                    
-                    item_locations.sort()
-                    filler_locations.sort()
-                    
-                    num_pieces += self.pieces_per_location  # by swapping you have retro-actively an extra piece
+        _rebalance_item_locations(item_locations, filler_locations, self.possible_merges, self.npieces,
+                                  len(self.precollected_pieces), self.pieces_per_location, self.random)
         item_locations.append(self.npieces - 1)  # add the victory location to the item locations
 
         # Get self.locs_traps entries from filler_locations and put them in trap_locations, removing them from filler_locations
@@ -488,9 +535,11 @@ class JigsawWorld(World):
         board.locations = all_locations
 
         # self.possible_merges is a list, and self.possible_merges[x] is the number of merges you can make with x puzzle pieces
+        # The access rule of every location is JigsawLocation.access_rule, which only needs the number of pieces.
+        pieces_needed_per_merge = self.pieces_needed_per_merge
         for loc in board.locations:
             # loc.nmerges is the number of merges for that location. So "Merge 4 times" has nmerges equal to 4
-            loc.access_rule = lambda state, count=loc.nmerges: state.has("pcs", self.player, self.pieces_needed_per_merge[count])
+            loc.pieces_needed = pieces_needed_per_merge[loc.nmerges]
         
         ###
         self.filler_items_in_pool = 0
@@ -526,16 +575,20 @@ class JigsawWorld(World):
     
     def collect(self, state: "CollectionState", item: "Item") -> bool:
         change = super().collect(state, item)
-        if change and "Piece" in item.name:
-            pcs: int = int(item.name.split(' ')[0]) if item.name.split(' ')[0].isdigit() else 1
-            state.prog_items[item.player]["pcs"] += pcs
+        if change:
+            # items from create_item know their count, any other item is parsed here
+            pcs = item.pcs if isinstance(item, JigsawItem) else get_pcs_count(item.name)
+            if pcs:
+                state.prog_items[item.player]["pcs"] += pcs
         return change
 
     def remove(self, state: "CollectionState", item: "Item") -> bool:
         change = super().remove(state, item)
-        if change and "Piece" in item.name:
-            pcs: int = int(item.name.split(' ')[0]) if item.name.split(' ')[0].isdigit() else 1
-            state.prog_items[item.player]["pcs"] -= pcs
+        if change:
+            # items from create_item know their count, any other item is parsed here
+            pcs = item.pcs if isinstance(item, JigsawItem) else get_pcs_count(item.name)
+            if pcs:
+                state.prog_items[item.player]["pcs"] -= pcs
         return change
 
     def fill_slot_data(self):
@@ -569,9 +622,10 @@ class JigsawWorld(World):
         self.possible_merges = slot_data["possible_merges"]
         self.nx = slot_data["nx"]
         self.ny = slot_data["ny"]
-        self.pieces_needed_per_merge = [0]
-        for i in range(1, self.nx * self.ny):
-            self.pieces_needed_per_merge.append(next(index for index, value in enumerate(self.possible_merges) if value >= i))
+        self.pieces_needed_per_merge = _pieces_needed_per_merge(self.possible_merges, self.nx * self.ny)
+        # the location rules read pieces_needed, so update the locations that already exist as well
+        for loc in self.get_locations():
+            loc.pieces_needed = self.pieces_needed_per_merge[loc.nmerges]
 
     def write_spoiler(self, spoiler_handle: TextIO) -> None:
         spoiler_handle.write(f"\nSpoiler and info for [Jigsaw] player {self.player}")
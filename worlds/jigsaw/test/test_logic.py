@@ -0,0 +1,151 @@
+import unittest
+from random import Random
+
+from BaseClasses import CollectionState, Item, ItemClassification
+
+from . import JigsawTestBase
+from .. import _pieces_needed_per_merge, _rebalance_item_locations
+
+
+def first_index_reaching(possible_merges, merges):
+    return next(index for index, value in enumerate(possible_merges) if value >= merges)
+
+
+def rebalance_item_locations_by_full_passes(item_locations, filler_locations, possible_merges, npieces, precollected,
+                                            pieces_per_location, random):
+    # the original rebalancing loop, which restarts from location 1 after every pass with a swap
+    do_again = True
+    while do_again:
+        num_pieces = precollected
+
+        do_again = False
+        for i in range(1, npieces - 1):
+
+            if i in item_locations:
+                num_pieces += pieces_per_location
+            if i >= possible_merges[min(npieces, int(num_pieces))]:
+                do_again = True
+                item_loc_candidates = [loc for loc in item_locations if loc > i]
+                filler_loc_candidates = [loc for loc in filler_locations if loc <= i]
+                if item_loc_candidates and filler_loc_candidates:
+                    chosen_item_loc = random.choice(item_loc_candidates)
+                    item_locations.remove(chosen_item_loc)
+                    filler_locations.append(chosen_item_loc)
+
+                    chosen_filler_loc = random.choice(filler_loc_candidates)
+                    filler_locations.remove(chosen_filler_loc)
+                    item_locations.append(chosen_filler_loc)
+                else:
+                    raise RuntimeError("Jigsaw: Failed to find location.......")
+
+                item_locations.sort()
+                filler_locations.sort()
+
+                num_pieces += pieces_per_location
+
+
+class TestRebalanceItemLocations(unittest.TestCase):
+    def run_rebalance(self, rebalance, layout, seed):
+        item_locations, filler_locations, possible_merges, npieces, precollected, pieces_per_location = layout
+        item_locations = list(item_locations)
+        filler_locations = list(filler_locations)
+        random = Random(seed)
+        try:
+            rebalance(item_locations, filler_locations, possible_merges, npieces, precollected, pieces_per_location,
+                      random)
+        except RuntimeError:
+            return "failed", random.random()
+        return item_locations, filler_locations, random.random()
+
+    def test_matches_full_passes(self):
+        # possible_merges with local drops, so that resuming a pass too late would be noticed
+        layout_random = Random(0)
+        for case in range(2000):
+            npieces = layout_random.randint(6, 60)
+            possible_merges = [-layout_random.randint(0, 4)]
+            for _ in range(npieces):
+                possible_merges.append(possible_merges[-1] + layout_random.choice([1, 2, 2, 3, 3, 4, 0, -1, -3]))
+            possible_merges[-1] = max(possible_merges[-1], npieces)
+            locations = list(range(1, npieces - 1))
+            layout_random.shuffle(locations)
+            split = layout_random.randint(0, len(locations))
+            layout = (sorted(locations[:split]), sorted(locations[split:]), possible_merges, npieces,
+                      layout_random.randint(0, 5), layout_random.randint(1, 3))
+            with self.subTest(case=case):
+                self.assertEqual(self.run_rebalance(_rebalance_item_locations, layout, case),
+                                 self.run_rebalance(rebalance_item_locations_by_full_passes, layout, case))
+
+
+class TestPiecesNeededPerMerge(unittest.TestCase):
+    def test_non_monotone_possible_merges(self):
+        # possible_merges of a 25 piece world with 3 checks out of logic, which drops from 4 to 3 where the
+        # precollected pieces end
+        possible_merges = [-2, -2, -2, -2, -2, 0, 0, 1, 2, 2, 2, 4, 4, 3, 3, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 24]
+        needed = _pieces_needed_per_merge(possible_merges, 25)
+        self.assertEqual(needed[4], 11)
+        self.assertEqual(needed, [0] + [first_index_reaching(possible_merges, i) for i in range(1, 25)])
+
+
+class TestChecksOutOfLogic(JigsawTestBase):
+    options = {
+        "number_of_pieces": 25,
+        "checks_out_of_logic": 3,
+    }
+
+    def test_pieces_needed_per_merge(self):
+        world = self.world
+        expected = [0] + [first_index_reaching(world.possible_merges, i) for i in range(1, world.npieces)]
+        self.assertEqual(world.pieces_needed_per_merge, expected)
+        state = CollectionState(self.multiworld)
+        for location in self.multiworld.get_locations(self.player):
+            with self.subTest(location=location.name):
+                state.prog_items[self.player]["pcs"] = expected[location.nmerges]
+                self.assertTrue(location.access_rule(state))
+                state.prog_items[self.player]["pcs"] = expected[location.nmerges] - 1
+                self.assertFalse(location.access_rule(state))
+
+
+class TestInterpretSlotData(JigsawTestBase):
+    options = {
+        "number_of_pieces": 25,
+    }
+
+    def test_location_rules_follow_slot_data(self):
+        world = self.world
+        location = min(world.get_locations(), key=lambda loc: loc.nmerges)
+        needed_before = world.pieces_needed_per_merge[location.nmerges]
+        # with fewer merges for the first pieces, this location needs 3 more pieces than before
+        slot_data = world.fill_slot_data()
+        slot_data["possible_merges"] = [min(merges, location.nmerges - 1) if pieces < needed_before + 3 else merges
+                                        for pieces, merges in enumerate(slot_data["possible_merges"])]
+        world.interpret_slot_data(slot_data)
+        needed_after = world.pieces_needed_per_merge[location.nmerges]
+        self.assertGreaterEqual(needed_after, needed_before + 3)
+
+        state = CollectionState(self.multiworld)
+        state.prog_items[self.player]["pcs"] = needed_after - 1
+        self.assertFalse(location.access_rule(state))
+        state.prog_items[self.player]["pcs"] = needed_after
+        self.assertTrue(location.access_rule(state))
+
+
+class TestCollectPieces(JigsawTestBase):
+    options = {
+        "number_of_pieces": 25,
+    }
+
+    def test_collect_counts_any_item(self):
+        state = CollectionState(self.multiworld)
+        world = self.world
+        items = [
+            world.create_item("5 Puzzle Pieces"),
+            Item("3 Puzzle Pieces", ItemClassification.progression, None, self.player),
+            Item("Victory", ItemClassification.progression, None, self.player),
+        ]
+        start_pcs = state.prog_items[self.player]["pcs"]  # from the precollected pieces
+        for item in items:
+            world.collect(state, item)
+        self.assertEqual(state.prog_items[self.player]["pcs"], start_pcs + 8)
+        for item in items:
+            world.remove(state, item)
+        self.assertEqual(state.prog_items[self.player]["pcs"], start_pcs)